@@ -4,6 +4,10 @@ Creates core data types and functions which support all of brainbox.
 from pathlib import Path
 import numpy as np
 import pandas as pd
+from numba import njit, types
+from numba.typed import Dict
+
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'  # first bytes of a zstandard frame
 
 
 class Bunch(dict):
@@ -30,10 +34,20 @@ class Bunch(dict):
         Saves a npz file containing the arrays of the bunch.
 
         :param npz_file: output file
-        :param compress: bool (False) use compression
+        :param compress: bool (False) use compression, or 'zstd' to write the arrays as a single
+         zstandard compressed stream of npy records (faster than the npz deflate, requires the
+         zstandard package). NB: whatever its extension, such a file is not an npz archive: it
+         can't be read by np.load, only by Bunch.load
         :return: None
         """
-        if compress:
+        if compress == 'zstd':
+            import zstandard
+            with open(npz_file, 'wb') as fid, \
+                    zstandard.ZstdCompressor(level=3).stream_writer(fid) as writer:
+                np.lib.format.write_array(writer, np.array(list(self.keys()), dtype=str))
+                for v in self.values():
+                    np.lib.format.write_array(writer, np.asanyarray(v))
+        elif compress:
             np.savez_compressed(npz_file, **self)
         else:
             np.savez(npz_file, **self)
@@ -41,15 +55,23 @@ class Bunch(dict):
     @staticmethod
     def load(npz_file):
         """
-        Loads a npz file containing the arrays of the bunch.
+        Loads a npz file containing the arrays of the bunch, or a zstandard file written by
+        Bunch.save(..., compress='zstd').
 
         :param npz_file: output file
-        :param compress: bool (False) use compression
         :return: Bunch
         """
         if not Path(npz_file).exists():
             raise FileNotFoundError(f"{npz_file}")
-        return Bunch(np.load(npz_file))
+        with open(npz_file, 'rb') as fid:
+            is_zstd = fid.read(4) == _ZSTD_MAGIC
+        if not is_zstd:
+            return Bunch(np.load(npz_file))
+        import zstandard
+        with open(npz_file, 'rb') as fid, \
+                zstandard.ZstdDecompressor().stream_reader(fid) as reader:
+            keys = np.lib.format.read_array(reader)
+            return Bunch({str(k): np.lib.format.read_array(reader) for k in keys})
 
 
 class TimeSeries(dict):
@@ -65,6 +87,8 @@ class TimeSeries(dict):
 
         :param times: an ordered object containing a list of timestamps for the time series data
         :param values: an ordered object containing the associated measurements for each time stamp
+            Arrays passed as times and values are not copied: the TimeSeries entries and the
+            column entries are views on the original data.
         :param columns: a tuple or list of column labels, defaults to none. Each column name will
             be exposed as ts.colname in the TimeSeries object unless colnames are not strings.
 
@@ -78,12 +102,12 @@ class TimeSeries(dict):
                                notes=("Look, matey, I know a dead mouse when I see one, "
                                       'and I'm looking at one right now."))
         """
-        super(TimeSeries, self).__init__(times=np.array(times), values=np.array(values),
+        super(TimeSeries, self).__init__(times=np.asarray(times), values=np.asarray(values),
                                          columns=columns, *args, **kwargs)
         self.__dict__ = self
         self.columns = columns
         if self.values.ndim == 1:
-            self.values = self.values.reshape(-1, 1)
+            self.values = self.values[:, np.newaxis]
 
         # Enforce times dict key which contains a list or array of timestamps
         if len(self.times) != len(values):
@@ -101,22 +125,227 @@ class TimeSeries(dict):
         return TimeSeries(super(TimeSeries, self).copy())
 
 
-def ismember(a, b):
+def ismember(a, b, assume_sorted=False, kind='stable'):
     """
     equivalent of np.isin but returns indices as in the matlab ismember function
     returns an array containing logical 1 (true) where the data in A is B
     also returns the location of members in b such as a[lia] == b[locb]
     :param a: 1d - array
     :param b: 1d - array
+    :param assume_sorted: bool (False) if True, b is assumed sorted and is not sorted again
+    :param kind: ('stable') sorting algorithm for b, see np.argsort. Only applies to non-integer
+     (and uint64) inputs: other integers are looked up in a hash table, without sorting. The
+     stable sort guarantees that locb points to the first occurrence in b
     :return: isin, locb
     """
-    lia = np.isin(a, b)
-    aun, _, iuainv = np.unique(a[lia], return_index=True, return_inverse=True)
-    _, ibu, iau = np.intersect1d(b, aun, return_indices=True)
-    locb = ibu[iuainv]
+    a, b = np.asarray(a), np.asarray(b).ravel()
+    if b.size == 0:
+        return np.zeros(a.shape, dtype=bool), np.array([], dtype=np.int64)
+    # the values of a outside of the range of b are discarded before any search
+    ina = _in_range(a, b)
+    if ina is None:
+        return _ismember(a, b, assume_sorted=assume_sorted, kind=kind)
+    lia = np.zeros(a.shape, dtype=bool)
+    lia[ina], locb = _ismember(a[ina], b, assume_sorted=assume_sorted, kind=kind)
     return lia, locb
 
 
+def _in_range(a, b):
+    """
+    Cheap bounds test before set operations
+    :param a: array
+    :param b: array
+    :return: boolean mask of the values of a within [min(b), max(b)], None if a and b are not
+     both real numbers or if the range of b is undefined
+    """
+    if b.size == 0 or not all(np.issubdtype(x.dtype, np.integer) or
+                              np.issubdtype(x.dtype, np.floating) for x in (a, b)):
+        return None
+    bmin, bmax = np.min(b), np.max(b)
+    if not bmin <= bmax:  # nans
+        return None
+    return (a >= bmin) & (a <= bmax)
+
+
+def _ismember(a, b, assume_sorted=False, kind='stable'):
+    """
+    ismember search, see ismember. b is flat and not empty
+    """
+    # integers are looked up in a hash table in a single pass, without sorting
+    if not assume_sorted and all(np.issubdtype(x.dtype, np.integer) and
+                                 np.can_cast(x.dtype, np.int64) for x in (a, b)):
+        lia, locb = _ismember_int(a.ravel().astype(np.int64), b.astype(np.int64))
+        return lia.reshape(a.shape), locb
+    # a stable sort and a left-sided search so that locb points to the first occurrence in b
+    if assume_sorted:
+        bs = b
+    else:
+        ib = np.argsort(b, kind=kind)
+        bs = b[ib]
+    ibs = np.minimum(np.searchsorted(bs, a), bs.size - 1)
+    lia = bs[ibs] == a
+    locb = ibs[lia] if assume_sorted else ib[ibs[lia]]
+    return lia, locb
+
+
+@njit(cache=True)
+def _ismember_int(a, b):
+    """
+    Numba kernel of ismember for 1d int64 arrays, using a dictionary of the values of b
+    :param a: 1d int64 array
+    :param b: 1d int64 array
+    :return: isin, locb
+    """
+    d = Dict.empty(key_type=types.int64, value_type=types.int64)
+    for i in range(b.size - 1, -1, -1):  # backwards so that the first occurrence is kept
+        d[b[i]] = i
+    lia = np.zeros(a.size, dtype=np.bool_)
+    locb = np.empty(a.size, dtype=np.int64)
+    n = 0
+    for i in range(a.size):
+        if a[i] in d:
+            lia[i] = True
+            locb[n] = d[a[i]]
+            n += 1
+    return lia, locb[:n]
+
+
+def _row_keys(a0, a1):
+    """
+    Packs the rows of two 2d integer arrays into 1d keys such that a0[i, :] == a1[j, :] if and
+    only if k0[i] == k1[j]. The keys are the smallest unsigned integers that fit the ranges of
+    the columns: uint16 and uint32 keys are hashed by ismember, and uint16 keys are radix sorted
+    by np.intersect1d.
+    :param a0: 2d array
+    :param a1: 2d array
+    :return: k0, k1: 1d arrays of keys, or None if the rows are not integers or don't fit in
+     64 bits
+    """
+    if not (a0.dtype.kind in 'iu' and a1.dtype.kind in 'iu' and a0.size and a1.size):
+        return
+    # the ranges are python integers, so that mixed int64 and uint64 columns are exact
+    amin = [min(mn0, mn1) for mn0, mn1 in zip(a0.min(axis=0).tolist(), a1.min(axis=0).tolist())]
+    amax = [max(mx0, mx1) for mx0, mx1 in zip(a0.max(axis=0).tolist(), a1.max(axis=0).tolist())]
+    nbits = [(mx - mn).bit_length() for mn, mx in zip(amin, amax)]
+    if sum(nbits) > 64:
+        return
+    # the first column goes in the most significant bits, so keys sort as rows do
+    shifts = np.cumsum(nbits[::-1])[::-1] - nbits
+    key_dtype = next(dt for dt in (np.uint16, np.uint32, np.uint64)
+                     if sum(nbits) <= np.iinfo(dt).bits)
+
+    def _pack(a):
+        keys = np.zeros(a.shape[0], dtype=np.uint64)
+        for n in range(a.shape[1]):
+            keys |= ((a[:, n].astype(np.uint64) - np.uint64(amin[n] % 2 ** 64)) <<
+                     np.uint64(shifts[n]))
+        return keys.astype(key_dtype)
+    return _pack(a0), _pack(a1)
+
+
+def _row_codes(a):
+    """
+    Replaces the rows of a 2d array by integer codes such that a[i, :] == a[j, :] if and only if
+    codes[i] == codes[j]. Works for any sortable dtype, including objects.
+    :param a: 2d array
+    :return: codes: 1d int64 array
+    """
+    codes = np.zeros(a.shape[0], dtype=np.int64)
+    for n in range(a.shape[1]):
+        values, inv = np.unique(a[:, n], return_inverse=True)
+        codes = np.unique(codes * values.size + inv, return_inverse=True)[1]
+    return codes
+
+
+def _exact_rows(a0, a1):
+    """
+    Casts mixed signed and unsigned integer arrays to objects: np.result_type(int64, uint64) is
+    float64, which would merge distinct large integers when the columns are compared.
+    """
+    if {a0.dtype.kind, a1.dtype.kind} == {'i', 'u'}:
+        return a0.astype(object), a1.astype(object)
+    return a0, a1
+
+
+def _ismember_rows(a0, a1):
+    """
+    ismember2d for rows that can't be packed in integer keys. The first column of a0 is looked
+    up in a1: when its value is unique in a1, the remaining columns are compared with the single
+    candidate row. Only the rows of a0 whose first value is repeated in a1 are matched on whole
+    rows. Rows of a0 containing NaN are never members, as in ismember.
+    :param a0: 2d array
+    :param a1: 2d array
+    :return: isin, locb
+    """
+    n0, n1 = a0.shape[0], a1.shape[0]
+    if n0 < n1:  # only the rows of a1 whose first value is in a0 can match
+        i1 = np.flatnonzero(ismember(a1[:, 0], a0[:, 0])[0])
+        n1 = i1.size
+    else:
+        i1 = np.arange(n1)
+    # a single lookup finds the first row of a1 for each first value, for a1 and a0
+    lia, locb = ismember(np.r_[a1[i1, 0], a0[:, 0]], a1[i1, 0])
+    idx = np.flatnonzero(lia)
+    in1 = idx < n1
+    j, first = idx[in1], locb[in1]
+    repeated = np.zeros(n1, dtype=bool)
+    repeated[j[first != j]] = True
+    repeated[first[first != j]] = True
+    i0, loc0 = idx[~in1] - n1, locb[~in1]
+    # first values unique in a1: compare the other columns of the candidate row
+    isin, locb = np.zeros(n0, dtype=bool), np.zeros(n0, dtype=np.int64)
+    i, j = i0[~repeated[loc0]], loc0[~repeated[loc0]]
+    match = np.all(a0[i, 1:] == a1[i1[j], 1:], axis=1)
+    isin[i[match]], locb[i[match]] = True, i1[j[match]]
+    # repeated first values: match the whole rows
+    i, j = i0[repeated[loc0]], i1[repeated]
+    if a0.dtype.kind in 'fc':
+        i = i[~np.any(np.isnan(a0[i, :]), axis=1)]
+    if i.size:
+        codes = _row_codes(np.r_[a0[i, :], a1[j, :]])
+        lic, locc = ismember(codes[:i.size], codes[i.size:])
+        isin[i[lic]], locb[i[lic]] = True, j[locc]
+    return isin, locb[isin]
+
+
+def _intersect_rows(a0, a1):
+    """
+    intersect2d for rows that can't be packed in integer keys: the first columns are intersected
+    and, for the first values that are unique in both arrays, the remaining columns of the two
+    candidate rows are compared. Only the rows whose first value is repeated are matched on
+    whole rows. Rows containing NaN never intersect.
+    :param a0: 2d array
+    :param a1: 2d array
+    :return: i0, i1: indices of the first occurrences of the common rows in a0 and a1
+    """
+    # only the rows of the larger array whose first value is in the smaller array can match
+    sel = [np.arange(a0.shape[0]), np.arange(a1.shape[0])]
+    if 4 * a0.shape[0] < a1.shape[0]:
+        sel[1] = np.flatnonzero(ismember(a1[:, 0], a0[:, 0])[0])
+    elif 4 * a1.shape[0] < a0.shape[0]:
+        sel[0] = np.flatnonzero(ismember(a0[:, 0], a1[:, 0])[0])
+    a0, a1 = a0[sel[0], :], a1[sel[1], :]
+    u0, f0, c0 = np.unique(a0[:, 0], return_index=True, return_counts=True)
+    u1, f1, c1 = np.unique(a1[:, 0], return_index=True, return_counts=True)
+    _, k0, k1 = np.intersect1d(u0, u1, assume_unique=True, return_indices=True)
+    # first values unique in both arrays: compare the other columns of the candidate rows
+    single = (c0[k0] == 1) & (c1[k1] == 1)
+    i0, i1 = f0[k0[single]], f1[k1[single]]
+    match = np.all(a0[i0, 1:] == a1[i1, 1:], axis=1)
+    i0, i1 = i0[match], i1[match]
+    # repeated first values: match the whole rows
+    repeated = u0[k0[~single]]
+    if repeated.size:
+        j0 = np.flatnonzero(ismember(a0[:, 0], repeated)[0])
+        j1 = np.flatnonzero(ismember(a1[:, 0], repeated)[0])
+        if a0.dtype.kind in 'fc':
+            j0 = j0[~np.any(np.isnan(a0[j0, :]), axis=1)]
+        codes = _row_codes(np.r_[a0[j0, :], a1[j1, :]])
+        _, r0, r1 = np.intersect1d(codes[:j0.size], codes[j0.size:], return_indices=True)
+        i0, i1 = np.r_[i0, j0[r0]], np.r_[i1, j1[r1]]
+    return sel[0][i0], sel[1][i1]
+
+
 def ismember2d(a0, a1):
     """
     Equivalent of np.isin but returns indices as in the matlab ismember function
@@ -126,13 +355,11 @@ def ismember2d(a0, a1):
     :param a1: 2d array
     :return: isin, locb
     """
-    # a[lia] == b[locb]
-    ia, ib = ismember(a0[:, 0], a1[:, 0])
-    for n in np.arange(1, a0.shape[1]):
-        iia, iib = ismember(a0[ia, n], a1[ib, n])
-        ib = ib[iib]
-        ia[np.where(ia)[0]] = iia
-    return ia, ib
+    a0, a1 = np.asarray(a0), np.asarray(a1)
+    keys = _row_keys(a0, a1)
+    if keys is None:
+        return _ismember_rows(*_exact_rows(a0, a1))
+    return ismember(*keys)
 
 
 def intersect2d(a0, a1, assume_unique=False):
@@ -144,11 +371,16 @@ def intersect2d(a0, a1, assume_unique=False):
     :return: index of a0 such as intersection = a0[ia, :]
     :return: index of b0 such as intersection = b0[ib, :]
     """
-    _, i0, i1 = np.intersect1d(a0[:, 0], a1[:, 0],
-                               return_indices=True, assume_unique=assume_unique)
-    for n in np.arange(1, a0.shape[1]):
-        _, ii0, ii1 = np.intersect1d(a0[i0, n], a1[i1, n],
-                                     return_indices=True, assume_unique=assume_unique)
-        i0 = i0[ii0]
-        i1 = i1[ii1]
+    a0, a1 = np.asarray(a0), np.asarray(a1)
+    keys = _row_keys(a0, a1)
+    if keys is None:
+        i0, i1 = _intersect_rows(*_exact_rows(a0, a1))
+        return a0[i0, :], i0, i1
+    k0, k1 = keys
+    # the rows outside of the range of keys of the other array are discarded first
+    in0, in1 = _in_range(k0, k1), _in_range(k1, k0)
+    in0, in1 = np.flatnonzero(in0), np.flatnonzero(in1)
+    _, i0, i1 = np.intersect1d(k0[in0], k1[in1], return_indices=True,
+                               assume_unique=assume_unique)
+    i0, i1 = in0[i0], in1[i1]
     return a0[i0, :], i0, i1
@@ -1,12 +1,10 @@
-import time
+import os.path as op
 import numpy as np
-# (Previously required `os.path` to get file info before memmapping)
-# import os.path as op
-from ibllib.io import spikeglx
+from tqdm import tqdm
 
 
 def extract_waveforms(ephys_file, ts, ch, t=2.0, sr=30000, n_ch_probe=385, dtype='int16',
-                      offset=0, car=True):
+                      offset=0, car=True, max_bytes=2e8, out=None, progress_bar=True):
     '''
     Extracts spike waveforms from binary ephys data file, after (optionally)
     common-average-referencing (CAR) spatial noise.
@@ -14,7 +12,8 @@ def extract_waveforms(ephys_file, ts, ch, t=2.0, sr=30000, n_ch_probe=385, dtype
     Parameters
     ----------
     ephys_file : string
-        The file path to the binary ephys data.
+        The file path to the binary ephys data. Compressed (.cbin) files must be decompressed
+        first, e.g. with `ibllib.io.spikeglx.Reader.decompress_file`.
     ts : ndarray_like
         The timestamps (in s) of the spikes.
     ch : ndarray_like
@@ -30,12 +29,23 @@ def extract_waveforms(ephys_file, ts, ch, t=2.0, sr=30000, n_ch_probe=385, dtype
     offset: int (optional)
         The offset (in bytes) from the start of `ephys_file`.
     car: bool (optional)
-        A flag to perform CAR before extracting waveforms.
+        A flag to perform CAR before extracting waveforms. The noise of each channel is the
+        median over chunks (of up to 5e6 samples) of the median of every 10th sample.
+    max_bytes: numeric (optional)
+        The maximum size (in bytes) of a contiguous block of samples read at once from
+        `ephys_file`.
+    out: string or Path (optional)
+        If given, the file path of a .npy file to which the waveforms are written as they are
+        extracted, for spike counts whose waveforms don't fit in memory.
+    progress_bar: bool (optional)
+        A flag to display the progress of the extraction (in number of spikes).
 
     Returns
     -------
     waveforms : ndarray
-        An array of shape (#spikes, #samples, #channels) containing the waveforms.
+        An array of shape (#spikes, #samples, #channels) containing the waveforms, of datatype
+        `dtype` if `car` is False, and float32 otherwise. If `out` is
+        given, this is a memmap of the .npy file.
 
     Examples
     --------
@@ -64,17 +74,16 @@ def extract_waveforms(ephys_file, ts, ch, t=2.0, sr=30000, n_ch_probe=385, dtype
         >>> wf_car = bb.io.extract_waveforms(path_to_ephys_file, ts, ch, car=True)
     '''
 
-    # (Previously memmaped the file manually, but now use `spikeglx.Reader`)
-    # item_bytes = np.dtype(dtype).itemsize
-    # n_samples = (op.getsize(ephys_file) - offset) // (item_bytes * n_ch_probe)
-    # file_m = np.memmap(ephys_file, shape=(n_samples, n_ch_probe), dtype=dtype, mode='r')
-
     # Get memmapped array of `ephys_file`
-    s_reader = spikeglx.Reader(ephys_file)
-    file_m = s_reader.data  # the memmapped array
-    n_wf_samples = np.int(sr / 1000 * (t / 2))  # number of samples to return on each side of a ts
-    ts_samples = np.array(ts * sr).astype(int)  # the samples corresponding to `ts`
-    t_sample_first = ts_samples[0] - n_wf_samples
+    if str(ephys_file).endswith('.cbin'):
+        raise ValueError('{} is compressed: decompress it first, e.g. with '
+                         '`spikeglx.Reader.decompress_file`'.format(ephys_file))
+    item_bytes = np.dtype(dtype).itemsize
+    n_samples = (op.getsize(ephys_file) - offset) // (item_bytes * n_ch_probe)
+    file_m = np.memmap(ephys_file, shape=(n_samples, n_ch_probe), dtype=dtype, mode='r',
+                       offset=offset)
+    n_wf_samples = int(sr * t / 2000)  # number of samples to return on each side of a ts
+    ts_samples = np.rint(np.asarray(ts) * sr).astype(np.int64)  # the samples corresponding to `ts`
 
     # Exception handling for impossible channels
     ch = np.asarray(ch)
@@ -84,28 +93,65 @@ def extract_waveforms(ephys_file, ts, ch, t=2.0, sr=30000, n_ch_probe=385, dtype
                         ' number was {}, and the maximum channel number was {}. Check specified'
                         ' channel numbers and try again.'.format(np.min(ch), np.max(ch)))
 
-    if car:  # compute spatial noise in chunks
-        # see https://github.com/int-brain-lab/iblenv/issues/5
-        raise NotImplementedError("CAR option is not available")
+    if car:  # compute spatial noise as the median over chunks of each channel's median
+        n_chunk_samples = int(5e6)  # number of samples per chunk
+        car_stride = 10  # the noise is a slow spatial statistic: read every 10th sample
+        t_sample_first = max(0, ts_samples.min() - n_wf_samples)
+        t_sample_last = ts_samples.max() + n_wf_samples
+        # chunks are a whole number of strides, so that they all have `n_rows` rows
+        n_chunk_samples = min(n_chunk_samples, t_sample_last - t_sample_first)
+        n_chunk_samples = max(car_stride, n_chunk_samples - n_chunk_samples % car_stride)
+        n_chunks = max(1, (t_sample_last - t_sample_first) // n_chunk_samples)
+        n_rows = n_chunk_samples // car_stride
+        # read whole chunks, at most `max_bytes` at once: the chunk medians don't depend on it
+        n_chunks_read = max(1, int(max_bytes // (n_rows * ch.size * item_bytes)))
+        chunk_medians = []
+        for first_chunk in range(0, n_chunks, n_chunks_read):
+            n_chunks_block = min(n_chunks_read, n_chunks - first_chunk)
+            b_first = t_sample_first + first_chunk * n_chunk_samples
+            b_last = b_first + n_chunks_block * n_chunk_samples
+            block = np.asarray(file_m[b_first:b_last:car_stride, ch.ravel()])
+            block = block.reshape((n_chunks_block, n_rows, ch.size))
+            # partial sort to the (upper) median of each chunk, O(n) instead of a full median
+            chunk_medians.append(np.partition(block, n_rows // 2, axis=1)[:, n_rows // 2, :])
+        noise_s = np.median(np.concatenate(chunk_medians), axis=0).astype(np.float32)
 
-    # Initialize `waveforms`, extract waveforms from `file_m`, and CAR.
-    waveforms = np.zeros((len(ts), 2 * n_wf_samples, ch.size))
-    # Give time estimate for extracting waveforms.
-    t0 = time.perf_counter()
-    for i in range(5):
-        waveforms[i, :, :] = \
-            file_m[i * n_wf_samples * 2 + t_sample_first:
-                   i * n_wf_samples * 2 + t_sample_first + n_wf_samples * 2, ch].reshape(
-                       (n_wf_samples * 2, ch.size))
-    dt = time.perf_counter() - t0
-    print('Performing waveform extraction. Estimated time is {:.2f} mins. ({})'
-          .format(dt * len(ts) / 60 / 5, time.ctime()))
-    for spk, _ in enumerate(ts):  # extract waveforms
-        spk_ts_sample = ts_samples[spk]
-        spk_samples = np.arange(spk_ts_sample - n_wf_samples, spk_ts_sample + n_wf_samples)
-        # have to reshape to add an axis to broadcast `file_m` into `waveforms`
-        waveforms[spk, :, :] = \
-            file_m[spk_samples[0]:spk_samples[-1] + 1, ch].reshape((spk_samples.size, ch.size))
-    print('Done. ({})'.format(time.ctime()))
+    # Initialize `waveforms` and extract waveforms from `file_m` in time-sorted blocks: windows
+    # that overlap or are less than a window apart are read once as one contiguous block, and
+    # the spike windows are selected from a (zero-copy) sliding window view of the block, then
+    # scattered into `waveforms` by spike index.
+    wf_shape = (len(ts), 2 * n_wf_samples, ch.size)
+    wf_dtype = np.float32 if car else np.dtype(dtype)
+    if out is None:
+        waveforms = np.zeros(wf_shape, dtype=wf_dtype)
+    else:
+        waveforms = np.lib.format.open_memmap(out, mode='w+', dtype=wf_dtype, shape=wf_shape)
+    n_bytes_unflushed = 0
+    pbar = tqdm(total=len(ts), disable=not progress_bar)
+    order = np.argsort(ts_samples, kind='stable')
+    starts = ts_samples[order] - n_wf_samples  # first sample of each (sorted) window
+    # split blocks on gaps between windows, and where a block would exceed `max_bytes`
+    max_block_samples = max(2 * n_wf_samples, int(max_bytes // (ch.size * item_bytes)))
+    new_block = np.r_[True, np.diff(starts) > 4 * n_wf_samples]
+    new_block |= np.r_[True, np.diff(starts // max_block_samples) > 0]
+    block_spks = np.r_[np.flatnonzero(new_block), starts.size]
+    for first_spk, last_spk in zip(block_spks[:-1], block_spks[1:]):
+        b_first, b_last = starts[first_spk], starts[last_spk - 1] + 2 * n_wf_samples
+        block = np.asarray(file_m[b_first:b_last, ch.ravel()])
+        windows = np.lib.stride_tricks.sliding_window_view(block, 2 * n_wf_samples, axis=0)
+        wf_block = windows[starts[first_spk:last_spk] - b_first].transpose((0, 2, 1))
+        if car:  # subtract in place, `noise_s` has the (float32) datatype of `waveforms`
+            wf_block = wf_block.astype(np.float32)
+            np.subtract(wf_block, noise_s.reshape((1, 1, -1)), out=wf_block)
+        waveforms[order[first_spk:last_spk], :, :] = wf_block
+        # write the extracted waveforms to disk every `max_bytes`
+        n_bytes_unflushed += wf_block.nbytes
+        if out is not None and n_bytes_unflushed > max_bytes:
+            waveforms.flush()
+            n_bytes_unflushed = 0
+        pbar.update(last_spk - first_spk)
+    pbar.close()
+    if out is not None:
+        waveforms.flush()
 
     return waveforms
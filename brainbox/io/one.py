@@ -9,6 +9,9 @@ from oneibl.one import ONE
 
 from brainbox.core import Bunch
 
+_REACTION_TIMES_CACHE = {}  # reaction times by eid and ONE, see load_wheel_reaction_times
+_REACTION_TIMES_CACHE_SIZE = 32
+
 
 def load_lfp(eid, one=None, dataset_types=None):
     """
@@ -251,15 +254,29 @@ def load_wheel_reaction_times(eid, one=None):
     ----------
     array-like
         reaction times
+
+    Notes
+    -----
+    The reaction times of the last sessions loaded are cached by eid and by database and cache
+    directory of `one` (None for the default instance), so that repeated calls do not reload the
+    data.
     """
-    if one is None:
-        one = ONE()
+    key = (eid, None if one is None else (one._par.ALYX_URL, one._par.CACHE_DIR))
+    if key not in _REACTION_TIMES_CACHE:
+        if one is None:
+            one = ONE()
+        _REACTION_TIMES_CACHE[key] = _load_wheel_reaction_times(eid, one)
+        if len(_REACTION_TIMES_CACHE) > _REACTION_TIMES_CACHE_SIZE:
+            _REACTION_TIMES_CACHE.pop(next(iter(_REACTION_TIMES_CACHE)))  # oldest entry
+    return _REACTION_TIMES_CACHE[key].copy()
+
 
+def _load_wheel_reaction_times(eid, one):
     trials = one.load_object(eid, 'trials')
     # If already extracted, load and return
     if trials and 'firstMovement_times' in trials:
         return trials['firstMovement_times'] - trials['goCue_times']
-    # Otherwise load wheelMoves object and calculate
+    # Otherwise load the wheelMoves object and calculate
     moves = one.load_object(eid, 'wheelMoves')
     # Re-extract wheel moves if necessary
     if not moves or 'peakAmplitude' not in moves:
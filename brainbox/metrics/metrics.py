@@ -260,6 +260,8 @@ def wf_similarity(wf1, wf2):
     warnings.filterwarnings('ignore', r'invalid value encountered in true_divide')
     assert wf1.shape == wf2.shape, ('The shapes of the sets of waveforms are inconsistent ({})'
                                     '({})'.format(wf1.shape, wf2.shape))
+    # Avoid overflows when multiplying integer (e.g. int16) waveforms.
+    wf1, wf2 = np.asarray(wf1, dtype=np.float64), np.asarray(wf2, dtype=np.float64)
 
     # Get number of spikes, samples, and channels of waveforms.
     n_spks = wf1.shape[0]
@@ -589,6 +591,8 @@ def ptp_over_noise(ephys_file, ts, ch, t=2.0, sr=30000, n_ch_probe=385, dtype='i
     # Get waveforms.
     wf = bb.io.extract_waveforms(ephys_file, ts, ch, t=t, sr=sr, n_ch_probe=n_ch_probe,
                                  dtype=dtype, offset=offset, car=car)
+    # Avoid overflows of the peak-to-peak of integer (int16 when `car` is False) waveforms.
+    wf = wf.astype(np.float32, copy=False)
 
     # Initialize `mean_ptp` based on `ch`, and compute mean ptp of all spikes for each ch.
     mean_ptp = np.zeros((ch.size,))
@@ -1,3 +1,4 @@
+import importlib.util
 import unittest
 import tempfile
 from pathlib import Path
@@ -34,6 +35,89 @@ class TestIsmember(unittest.TestCase):
         locb_ = np.array([1, 3])
         _check_ismember(a, b, lia_, locb_)
 
+        # sorted b with duplicates: the first occurrence is returned
+        b = np.array([0, 1, 3, 4, 4])
+        a = np.array([4, 1, 5, 4, -1])
+        lia, locb = core.ismember(a, b, assume_sorted=True)
+        self.assertTrue(np.all(lia == np.array([True, True, False, True, False])))
+        self.assertTrue(np.all(locb == np.array([3, 1, 3])))
+        # floats are not hashed but searched in the sorted b
+        lia_, locb_ = core.ismember(a.astype(float), b.astype(float))
+        self.assertTrue(np.all(lia_ == lia))
+        self.assertTrue(np.all(locb_ == locb))
+        # empty b
+        lia, locb = core.ismember(a, np.array([]))
+        self.assertFalse(np.any(lia))
+        self.assertTrue(locb.size == 0)
+
+    def test_ismember2d(self):
+        b = np.array([[0, 1], [0, 2], [1, 1], [0, 2], [2, 0]])
+        a = np.array([[0, 2], [1, 2], [2, 0], [1, 1], [0, 1]])
+        lia, locb = core.ismember2d(a, b)
+        self.assertTrue(np.all(lia == np.array([True, False, True, True, True])))
+        self.assertTrue(np.all(locb == np.array([1, 4, 2, 0])))
+        self.assertTrue(np.all(a[lia, :] == b[locb, :]))
+        # int64 ranges that can't be packed in 64 bits, and floats
+        for scale in (2 ** 61, 0.5):
+            lia_, locb_ = core.ismember2d(a * scale, b * scale)
+            self.assertTrue(np.all(lia_ == lia))
+            self.assertTrue(np.all(locb_ == locb))
+        # object rows, e.g. string columns of a dataframe
+        lia_, locb_ = core.ismember2d(a.astype(str).astype(object), b.astype(str).astype(object))
+        self.assertTrue(np.all(lia_ == lia))
+        self.assertTrue(np.all(locb_ == locb))
+        lia, locb = core.ismember2d(np.array([['a', 'b'], ['c', 'd']], dtype=object),
+                                    np.array([['c', 'd']], dtype=object))
+        self.assertTrue(np.all(lia == np.array([False, True])))
+        self.assertTrue(np.all(locb == np.array([0])))
+        v, i0, i1 = core.intersect2d(a.astype(str).astype(object), b.astype(str).astype(object))
+        self.assertTrue(np.all(v == a[i0, :].astype(str)))
+        self.assertTrue(np.all(a[i0, :] == b[i1, :]))
+        # mixed signed and unsigned integers are compared exactly, not as float64
+        i64 = np.array([[2 ** 62, 1], [-1, 1]], dtype=np.int64)
+        u64 = np.array([[2 ** 62 + 1, 1], [2 ** 64 - 1, 1]], dtype=np.uint64)
+        lia, locb = core.ismember2d(i64, u64)
+        self.assertFalse(np.any(lia))
+        # rows containing NaN are never members, as in ismember
+        f = np.array([[np.nan, 1.], [1., np.nan], [0., 2.], [1., 3.]])
+        lia, locb = core.ismember2d(f, f)
+        self.assertTrue(np.all(lia == np.array([False, False, True, True])))
+        self.assertTrue(np.all(locb == np.array([2, 3])))
+        v, i0, i1 = core.intersect2d(f, f)
+        self.assertEqual(set(i0), {2, 3})
+        # unpackable rows with repeated first values, against a brute force search
+        b = np.random.randint(0, 3, (50, 3)) * 0.5
+        a = np.random.randint(0, 4, (200, 3)) * 0.5
+        eq = np.all(a[:, np.newaxis, :] == b[np.newaxis, :, :], axis=2)
+        lia, locb = core.ismember2d(a, b)
+        self.assertTrue(np.all(lia == np.any(eq, axis=1)))
+        self.assertTrue(np.all(locb == np.argmax(eq, axis=1)[lia]))
+        for a0, a1 in ((a, b), (b, a), (a[:10], b)):
+            v, i0, i1 = core.intersect2d(a0, a1)
+            self.assertTrue(np.all(a0[i0, :] == a1[i1, :]))
+            self.assertEqual(i0.size, np.unique(a0[core.ismember2d(a0, a1)[0]], axis=0).shape[0])
+
+
+class TestTimeSeries(unittest.TestCase):
+
+    def test_no_copy(self):
+        times = np.arange(10) / 10
+        values = np.random.rand(10, 2)
+        ts = core.TimeSeries(times, values, columns=('x', 'y'))
+        self.assertTrue(np.shares_memory(ts.times, times))
+        self.assertTrue(np.shares_memory(ts.values, values))
+        self.assertTrue(np.shares_memory(ts.y, values))
+        self.assertTrue(np.all(ts.y == values[:, 1]))
+        # 1d values are exposed as a column view
+        ts = core.TimeSeries(times, values[:, 0])
+        self.assertEqual(ts.values.shape, (10, 1))
+        self.assertTrue(np.shares_memory(ts.values, values))
+        # lists are converted to arrays
+        ts = core.TimeSeries(list(times), list(values[:, 0]))
+        self.assertTrue(isinstance(ts.values, np.ndarray))
+        with self.assertRaises(ValueError):
+            core.TimeSeries(times[:-1], values)
+
 
 class TestBunch(unittest.TestCase):
 
@@ -70,6 +154,19 @@ class TestBunch(unittest.TestCase):
             another_bunch = core.Bunch.load(npz_filec)
             [self.assertTrue(np.all(abunch[k]) == np.all(another_bunch[k])) for k in abunch]
 
+    @unittest.skipIf(importlib.util.find_spec('zstandard') is None, 'zstandard not installed')
+    def test_bunch_io_zstd(self):
+        abunch = core.Bunch({'a': np.random.rand(50, 1), 'b': np.arange(12, dtype=np.int16),
+                             'c': np.array(['toto', 'tata'])})
+        with tempfile.TemporaryDirectory() as td:
+            npz_file = Path(td).joinpath('test_bunch.npz')
+            abunch.save(npz_file, compress='zstd')
+            another_bunch = core.Bunch.load(npz_file)
+            self.assertEqual(list(abunch.keys()), list(another_bunch.keys()))
+            for k in abunch:
+                self.assertEqual(abunch[k].dtype, another_bunch[k].dtype)
+                self.assertTrue(np.all(abunch[k] == another_bunch[k]))
+
 
 if __name__ == "__main__":
     unittest.main(exit=False)
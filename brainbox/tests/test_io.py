@@ -1,12 +1,16 @@
 import json
 from pathlib import Path
+import tempfile
+import shutil
 import unittest
 import uuid
 
 import numpy as np
 
 from brainbox.core import intersect2d, ismember2d, ismember
+from brainbox.io.io import extract_waveforms
 from brainbox.io.parquet import uuid2np, np2uuid, rec2col, np2str
+from ibllib.io import spikeglx
 
 
 class TestParquet(unittest.TestCase):
@@ -74,3 +78,92 @@ class TestParquet(unittest.TestCase):
         uuids = [uuid.uuid4() for _ in np.arange(4)]
         np_uuids = uuid2np(uuids)
         assert np2uuid(np_uuids) == uuids
+
+
+class TestExtractWaveforms(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        file_meta = Path(__file__).parents[2].joinpath(
+            'tests', 'ibllib', 'fixtures', 'io', 'spikeglx', 'sample3A_short_g0_t0.imec.ap.meta')
+        mock = spikeglx._mock_spikeglx_file(
+            Path(self.tempdir.name).joinpath('sample3A_short_g0_t0.imec.ap.bin'), file_meta,
+            ns=76104, nc=385, sync_depth=16, random=True)
+        self.bin_file, self.data = mock['bin_file'], mock['D']
+        np.random.seed(42)
+        # unsorted spike times, with duplicates and overlapping waveforms
+        self.ts = np.random.uniform(.01, 2.5, 400)
+        self.ts[:10] = self.ts[10:20]
+        self.ts[20:30] = self.ts[30:40] + 5 / 30000
+        self.ch = np.arange(100, 120)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _extract_waveforms_loop(self, ts, ch, n_wf_samples=30):
+        """Per-spike reference extraction"""
+        ts_samples = np.rint(ts * 30000).astype(np.int64)
+        return np.stack([self.data[s - n_wf_samples:s + n_wf_samples, :][:, ch]
+                         for s in ts_samples])
+
+    def test_extract_waveforms(self):
+        wf_ = self._extract_waveforms_loop(self.ts, self.ch)
+        wf = extract_waveforms(self.bin_file, self.ts, self.ch, car=False, progress_bar=False)
+        self.assertEqual(wf.dtype, np.int16)
+        self.assertTrue(np.all(wf == wf_))
+        # small blocks
+        wf = extract_waveforms(self.bin_file, self.ts, self.ch, car=False, max_bytes=1e3,
+                               progress_bar=False)
+        self.assertTrue(np.all(wf == wf_))
+        # single channel
+        wf = extract_waveforms(self.bin_file, self.ts, 7, car=False, progress_bar=False)
+        self.assertEqual(wf.shape, (self.ts.size, 60, 1))
+        self.assertTrue(np.all(wf == self._extract_waveforms_loop(self.ts, [7])))
+        # a binary file without metadata
+        bin_file = Path(self.tempdir.name).joinpath('raw.bin')
+        shutil.copy(self.bin_file, bin_file)
+        wf = extract_waveforms(bin_file, self.ts, self.ch, car=False, progress_bar=False)
+        self.assertTrue(np.all(wf == wf_))
+        # compressed files are not memmapped
+        with self.assertRaises(ValueError):
+            extract_waveforms(self.bin_file.with_suffix('.cbin'), self.ts, self.ch)
+
+    def test_extract_waveforms_car(self):
+        wf_ = self._extract_waveforms_loop(self.ts, self.ch)
+        wf = extract_waveforms(self.bin_file, self.ts, self.ch, car=True, progress_bar=False)
+        self.assertEqual(wf.dtype, np.float32)
+        # the same noise value is subtracted from all samples of a channel
+        noise = wf_ - wf
+        self.assertTrue(np.allclose(noise, noise[0, 0, :]))
+        # close to the median of each channel over the spikes region
+        first, last = np.rint(np.array([self.ts.min(), self.ts.max()]) * 30000).astype(int)
+        median = np.median(self.data[first - 30:last + 30, self.ch], axis=0)
+        self.assertTrue(np.allclose(noise[0, 0, :], median, atol=1500))
+        # exactly the (upper) median of every 10th sample over the spikes region, a single chunk
+        n_samples = (last - first + 60) // 10 * 10
+        rows = self.data[first - 30:first - 30 + n_samples:10, self.ch]
+        self.assertEqual(rows.shape[0], n_samples // 10)
+        median = np.partition(rows, rows.shape[0] // 2, axis=0)[rows.shape[0] // 2, :]
+        self.assertTrue(np.all(noise[0, 0, :] == median))
+        # the noise doesn't depend on the size of the blocks read
+        wf_small = extract_waveforms(self.bin_file, self.ts, self.ch, car=True, max_bytes=1e3,
+                                     progress_bar=False)
+        self.assertTrue(np.all(wf_small == wf))
+        # a single spike, with a spikes region shorter than a chunk
+        wf = extract_waveforms(self.bin_file, self.ts[:1], self.ch, car=True, max_bytes=1e3,
+                               progress_bar=False)
+        self.assertEqual(wf.shape, (1, 60, self.ch.size))
+
+    def test_extract_waveforms_out(self):
+        out = Path(self.tempdir.name).joinpath('waveforms.npy')
+        for car in (False, True):
+            wf = extract_waveforms(self.bin_file, self.ts, self.ch, car=car, max_bytes=1e4,
+                                   progress_bar=False)
+            wf_out = extract_waveforms(self.bin_file, self.ts, self.ch, car=car, max_bytes=1e4,
+                                       out=out, progress_bar=False)
+            self.assertTrue(isinstance(wf_out, np.memmap))
+            self.assertTrue(np.all(wf_out == wf))
+            del wf_out
+            wf_load = np.load(out)
+            self.assertEqual(wf_load.dtype, wf.dtype)
+            self.assertTrue(np.all(wf_load == wf))
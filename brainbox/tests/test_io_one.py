@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from brainbox.io import one as bbone
+from ibllib.io import params
+
+
+class MockONE:
+    """Mock ONE instance loading objects from a dictionary, and recording the objects loaded"""
+
+    def __init__(self, objects, alyx_url='https://alyx.test', cache_dir='/tmp'):
+        self.objects = objects
+        self._par = params.from_dict({'ALYX_URL': alyx_url, 'CACHE_DIR': cache_dir})
+        self.loaded = []
+
+    def load_object(self, eid, obj):
+        self.loaded.append(obj)
+        return self.objects.get(obj, {})
+
+
+class TestWheelReactionTimes(unittest.TestCase):
+
+    def setUp(self) -> None:
+        bbone._REACTION_TIMES_CACHE.clear()
+        self.go_cue = np.arange(5.)
+        self.first_move = self.go_cue + .2
+
+    def test_extracted(self):
+        # the first movement times are in the trials: wheelMoves is not loaded
+        trials = {'goCue_times': self.go_cue, 'firstMovement_times': self.first_move}
+        one = MockONE({'trials': trials})
+        rt = bbone.load_wheel_reaction_times('eid', one=one)
+        self.assertTrue(np.allclose(rt, .2))
+        self.assertEqual(one.loaded, ['trials'])
+
+    def test_wheel_moves(self):
+        # the first movement times are computed from wheelMoves, the wheel is not needed
+        trials = {'goCue_times': self.go_cue}
+        moves = {'intervals': np.zeros((5, 2)), 'peakAmplitude': np.ones(5)}
+        one = MockONE({'trials': trials, 'wheelMoves': moves})
+        extract = mock.MagicMock(return_value=(self.first_move, None, None))
+        with mock.patch.object(bbone, 'extract_first_movement_times', extract):
+            rt = bbone.load_wheel_reaction_times('eid', one=one)
+        self.assertTrue(np.allclose(rt, .2))
+        self.assertEqual(one.loaded, ['trials', 'wheelMoves'])
+        extract.assert_called_once_with(moves, trials)
+
+    def test_cached(self):
+        trials = {'goCue_times': self.go_cue, 'firstMovement_times': self.first_move}
+        one = MockONE({'trials': trials})
+        rt = bbone.load_wheel_reaction_times('eid', one=one)
+        rt[0] = 10  # the cached values are not modified by the caller
+        rt = bbone.load_wheel_reaction_times('eid', one=MockONE({}))
+        self.assertTrue(np.allclose(rt, .2))
+        self.assertEqual(one.loaded, ['trials'])
+        # a different database or cache directory is not served from the cache
+        for kwargs in ({'alyx_url': 'https://other.alyx.test'}, {'cache_dir': '/other'}):
+            other = MockONE({'trials': {'goCue_times': self.go_cue,
+                                        'firstMovement_times': self.go_cue + .5}}, **kwargs)
+            rt = bbone.load_wheel_reaction_times('eid', one=other)
+            self.assertTrue(np.allclose(rt, .5))
+            self.assertEqual(other.loaded, ['trials'])
+        # the default instance is only created on a cache miss
+        with mock.patch.object(bbone, 'ONE', return_value=one) as ONE:
+            bbone.load_wheel_reaction_times('eid')
+            bbone.load_wheel_reaction_times('eid')
+            ONE.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main(exit=False)
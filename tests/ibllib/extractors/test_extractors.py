@@ -85,30 +85,30 @@ class TestExtractTrialData(unittest.TestCase):
         # TRAINING SESSIONS
         cl, cr = extractors.training_trials.ContrastLR(
             self.training_lt5['path']).extract()[0]
-        self.assertTrue(all([np.sign(x) >= 0 for x in cl if ~np.isnan(x)]))
-        self.assertTrue(all([np.sign(x) >= 0 for x in cr if ~np.isnan(x)]))
+        self.assertTrue(np.all(cl[~np.isnan(cl)] >= 0))
+        self.assertTrue(np.all(cr[~np.isnan(cr)] >= 0))
         self.assertTrue(sum(np.isnan(cl)) + sum(np.isnan(cr)) == len(cl))
         self.assertTrue(sum(~np.isnan(cl)) + sum(~np.isnan(cr)) == len(cl))
         # -- version >= 5.0.0
         cl, cr = extractors.training_trials.ContrastLR(
             self.training_ge5['path']).extract()[0]
-        self.assertTrue(all([np.sign(x) >= 0 for x in cl if ~np.isnan(x)]))
-        self.assertTrue(all([np.sign(x) >= 0 for x in cr if ~np.isnan(x)]))
+        self.assertTrue(np.all(cl[~np.isnan(cl)] >= 0))
+        self.assertTrue(np.all(cr[~np.isnan(cr)] >= 0))
         self.assertTrue(sum(np.isnan(cl)) + sum(np.isnan(cr)) == len(cl))
         self.assertTrue(sum(~np.isnan(cl)) + sum(~np.isnan(cr)) == len(cl))
 
         # BIASED SESSIONS
         cl, cr = extractors.biased_trials.ContrastLR(
             self.biased_lt5['path']).extract()[0]
-        self.assertTrue(all([np.sign(x) >= 0 for x in cl if ~np.isnan(x)]))
-        self.assertTrue(all([np.sign(x) >= 0 for x in cr if ~np.isnan(x)]))
+        self.assertTrue(np.all(cl[~np.isnan(cl)] >= 0))
+        self.assertTrue(np.all(cr[~np.isnan(cr)] >= 0))
         self.assertTrue(sum(np.isnan(cl)) + sum(np.isnan(cr)) == len(cl))
         self.assertTrue(sum(~np.isnan(cl)) + sum(~np.isnan(cr)) == len(cl))
         # -- version >= 5.0.0
         cl, cr = extractors.biased_trials.ContrastLR(
             self.biased_ge5['path']).extract()[0]
-        self.assertTrue(all([np.sign(x) >= 0 for x in cl if ~np.isnan(x)]))
-        self.assertTrue(all([np.sign(x) >= 0 for x in cr if ~np.isnan(x)]))
+        self.assertTrue(np.all(cl[~np.isnan(cl)] >= 0))
+        self.assertTrue(np.all(cr[~np.isnan(cr)] >= 0))
         self.assertTrue(sum(np.isnan(cl)) + sum(np.isnan(cr)) == len(cl))
         self.assertTrue(sum(~np.isnan(cl)) + sum(~np.isnan(cr)) == len(cl))
 
@@ -148,9 +148,8 @@ class TestExtractTrialData(unittest.TestCase):
             session_path=self.training_lt5['path']).extract(save=False)[0]
         self.assertTrue(isinstance(choice, np.ndarray))
         data = raw.load_data(self.training_lt5['path'])
-        trial_nogo = np.array(
-            [~np.isnan(t['behavior_data']['States timestamps']['no_go'][0][0])
-             for t in data])
+        no_go = np.array([t['behavior_data']['States timestamps']['no_go'][0][0] for t in data])
+        trial_nogo = ~np.isnan(no_go)
         if any(trial_nogo):
             self.assertTrue(all(choice[trial_nogo]) == 0)
         # -- version >= 5.0.0
@@ -158,9 +157,8 @@ class TestExtractTrialData(unittest.TestCase):
             session_path=self.training_ge5['path']).extract(save=False)[0]
         self.assertTrue(isinstance(choice, np.ndarray))
         data = raw.load_data(self.training_ge5['path'])
-        trial_nogo = np.array(
-            [~np.isnan(t['behavior_data']['States timestamps']['no_go'][0][0])
-             for t in data])
+        no_go = np.array([t['behavior_data']['States timestamps']['no_go'][0][0] for t in data])
+        trial_nogo = ~np.isnan(no_go)
         if any(trial_nogo):
             self.assertTrue(all(choice[trial_nogo]) == 0)
 
@@ -169,9 +167,8 @@ class TestExtractTrialData(unittest.TestCase):
             session_path=self.biased_lt5['path']).extract(save=False)[0]
         self.assertTrue(isinstance(choice, np.ndarray))
         data = raw.load_data(self.biased_lt5['path'])
-        trial_nogo = np.array(
-            [~np.isnan(t['behavior_data']['States timestamps']['no_go'][0][0])
-             for t in data])
+        no_go = np.array([t['behavior_data']['States timestamps']['no_go'][0][0] for t in data])
+        trial_nogo = ~np.isnan(no_go)
         if any(trial_nogo):
             self.assertTrue(all(choice[trial_nogo]) == 0)
         # -- version >= 5.0.0
@@ -179,9 +176,8 @@ class TestExtractTrialData(unittest.TestCase):
             session_path=self.biased_ge5['path']).extract(save=False)[0]
         self.assertTrue(isinstance(choice, np.ndarray))
         data = raw.load_data(self.biased_ge5['path'])
-        trial_nogo = np.array(
-            [~np.isnan(t['behavior_data']['States timestamps']['no_go'][0][0])
-             for t in data])
+        no_go = np.array([t['behavior_data']['States timestamps']['no_go'][0][0] for t in data])
+        trial_nogo = ~np.isnan(no_go)
         if any(trial_nogo):
             self.assertTrue(all(choice[trial_nogo]) == 0)
 